@@ -4,45 +4,190 @@ matplotlib.use('Agg')  # 设置后端为Agg，避免GUI相关问题
 import matplotlib.pyplot as plt
 import numpy as np
 import argparse
+import mmap
 import os
+import stat
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 
-def parse_log_file(file_path):
+# 匹配score值
+_SCORE_RE = re.compile(rb'score:\s*(\d+)')
+# 不区分大小写匹配"not detect"，无需先把整块转为小写
+_NOT_DETECT_RE = re.compile(rb'not detect', re.IGNORECASE)
+
+# 匹配文件名中的数字，用于按数字顺序排序
+_NUM_RE = re.compile(r'\d+')
+
+# 得分区间数量（0-100分为10个等分区间）
+SCORE_BIN_COUNT = 10
+
+# score到区间下标的查找表：0-100对应区间0-9（100分归入最后一个区间），
+# 最后一项用于所有超出100的score，取值 SCORE_BIN_COUNT 表示不属于任何区间
+_BUCKET_LUT = np.append(np.minimum(np.arange(101) // 10, SCORE_BIN_COUNT - 1), SCORE_BIN_COUNT).astype(np.intp)
+
+def _score_buckets(scores):
     """
-    解析日志文件，提取所有的score值和对应的文件名
+    计算每个score所属的得分区间下标
+    
+    Args:
+        scores (list): 得分列表
+        
+    Returns:
+        numpy.ndarray: 区间下标，0-9对应 00-10 ... 90-100（100分归入最后一个区间），
+                       超出100的score为 SCORE_BIN_COUNT，不属于任何区间
+    """
+    scores_np = np.asarray(scores, dtype=np.intp)
+    return _BUCKET_LUT[np.minimum(scores_np, len(_BUCKET_LUT) - 1)]
+
+def _natural_key(name, _findall=_NUM_RE.findall):
+    """
+    生成按数字顺序排序文件名的键，例如 frame_2 排在 frame_10 之前
+    
+    Args:
+        name (str): 文件名
+        
+    Returns:
+        tuple: 文件名中依次出现的数字（int）
+    """
+    return tuple(int(digits) for digits in _findall(name))
+
+def _mmap_file(file_path):
+    """
+    以只读方式将日志文件映射到内存，避免整体读入并解码为str
     
     Args:
         file_path (str): 日志文件路径
         
     Returns:
-        tuple: (scores列表, 文件名列表)
+        mmap.mmap 或 bytes: 文件内容（空的普通文件返回b''；管道等无法映射的输入整体读入后返回bytes）
+    """
+    with open(file_path, 'rb') as f:
+        file_stat = os.fstat(f.fileno())
+        # 只有普通文件的大小可信，管道、/dev/stdin、<(cat log) 等输入的st_size总为0
+        if stat.S_ISREG(file_stat.st_mode):
+            if file_stat.st_size == 0:
+                return b''
+            try:
+                # 映射在文件关闭后依然有效，引用释放时自动解除
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # 所在文件系统不支持映射时改为整体读入
+                pass
+        return f.read()
+
+def _iter_file_blocks(content):
+    """
+    依次返回日志中每个"File: "之后的内容块，等价于 content.split(b'File: ')[1:]
+    
+    Args:
+        content (mmap.mmap 或 bytes): 日志文件内容
+        
+    Yields:
+        bytes: 单个文件的信息块
+    """
+    start = content.find(b'File: ')
+    while start != -1:
+        start += len(b'File: ')
+        end = content.find(b'File: ', start)
+        yield content[start:end] if end != -1 else content[start:]
+        start = end
+
+@dataclass
+class LogSummary:
+    """
+    单个日志文件的扫描结果，按文件在日志中出现的顺序保存
+    
+    Attributes:
+        filenames (list): 文件名列表
+        scores (list): 与filenames一一对应的score值（没有score的文件为0）
+        detected_count (int): 包含检测结果的文件数量
+        no_detection_files (list): 没有检测到目标的文件名列表
+    """
+    filenames: list = field(default_factory=list)
+    scores: list = field(default_factory=list)
+    detected_count: int = 0
+    no_detection_files: list = field(default_factory=list)
+    
+    @property
+    def file_count(self):
+        """日志中的文件数量"""
+        return len(self.filenames)
+
+def scan_log(file_path):
+    """
+    单次扫描日志文件，同时提取score、检测数量和没有检测到目标的文件
+    
+    Args:
+        file_path (str): 日志文件路径
+        
+    Returns:
+        LogSummary: 扫描结果
+    """
+    summary = LogSummary()
+    content = _mmap_file(file_path)
+    
+    # 循环内频繁调用的方法先绑定到局部变量，避免每个块都做属性查找
+    search_score = _SCORE_RE.search
+    search_not_detect = _NOT_DETECT_RE.search
+    add_filename = summary.filenames.append
+    add_score = summary.scores.append
+    add_no_detection = summary.no_detection_files.append
+    detected_count = 0
+    
+    for block in _iter_file_blocks(content):
+        filename = block.lstrip().partition(b'\n')[0].strip().decode('utf-8')
+        add_filename(filename)
+        
+        # 查找该文件中的score值，没有找到时添加默认值0；先用子串查找过滤掉没有score的块
+        score_match = search_score(block) if b'score:' in block else None
+        add_score(int(score_match.group(1)) if score_match else 0)
+        
+        # 检查文件块中是否包含"detected"但不包含"not detect"
+        if b'detected' in block and b'not detect' not in block:
+            detected_count += 1
+        
+        # 检查是否有"Object count: 0"或包含"not detect"（不区分大小写）的行，直接在原始字节上查找
+        if b'Object count: 0' in block or search_not_detect(block):
+            add_no_detection(filename)
+    
+    summary.detected_count = detected_count
+    return summary
+
+def scan_logs(file_paths):
     """
-    scores = []
-    filenames = []
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    扫描多个日志文件，多个文件时使用进程池并行扫描（解析为CPU密集型，进程池可绕开GIL）
+    
+    Args:
+        file_paths (list): 日志文件路径列表
         
-    # 使用正则表达式匹配File行和score值
-    file_blocks = content.split('File: ')[1:]  # 分割成块，每块是一个文件的信息
+    Returns:
+        list: (日志文件路径, LogSummary扫描结果) 列表，与 file_paths 一一对应（重复的路径也保留）
+    """
+    # 重复传入的同一文件只扫描一次，结果按原顺序复用
+    unique_paths = list(dict.fromkeys(file_paths))
+    if len(unique_paths) <= 1:
+        results = {file_path: scan_log(file_path) for file_path in unique_paths}
+    else:
+        workers = min(len(unique_paths), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = dict(zip(unique_paths, executor.map(scan_log, unique_paths)))
     
-    for block in file_blocks:
-        lines = block.strip().split('\n')
-        filename_line = lines[0]  # 第一行是文件名
-        filename = filename_line.strip()
+    return [(file_path, results[file_path]) for file_path in file_paths]
+
+def parse_log_file(file_path):
+    """
+    解析日志文件，提取所有的score值和对应的文件名
+    
+    Args:
+        file_path (str): 日志文件路径
         
-        # 查找该文件中的score值
-        score_match = re.search(r'score:\s*(\d+)', block)
-        if score_match:
-            score = int(score_match.group(1))
-            scores.append(score)
-            filenames.append(filename)
-        else:
-            # 如果没有找到score，添加默认值0
-            scores.append(0)
-            filenames.append(filename)
-    
-    return scores, filenames
+    Returns:
+        tuple: (scores列表, 文件名列表)
+    """
+    summary = scan_log(file_path)
+    return summary.scores, summary.filenames
 
-def save_filenames_by_score_ranges(scores, filenames, base_name="score"):
+def save_filenames_by_score_ranges(scores, filenames, base_name="score", no_detection_files=None):
     """
     根据得分区间保存文件名到不同的文件中
     
@@ -50,77 +195,50 @@ def save_filenames_by_score_ranges(scores, filenames, base_name="score"):
         scores (list): 得分列表
         filenames (list): 文件名列表
         base_name (str): 基础文件名前缀
+        no_detection_files (list): 没有检测到目标的文件名列表，为None时从 base_name_result.txt 中扫描
     """
-    # 定义得分区间
-    bins = np.linspace(0, 100, 11)  # 0, 10, 20, ..., 100
-    
-    # 创建一个字典来存储每个区间的文件名和得分
-    score_ranges = {}
-    for i in range(len(bins)-1):
-        range_key = f"{int(bins[i]):02d}-{int(bins[i+1]):02d}"
-        score_ranges[range_key] = []
-    
-    # 将文件名和得分分配到对应的得分区间
-    for score, filename in zip(scores, filenames):
-        # 特殊处理得分为0的情况
-        if score == 0:
-            score_ranges["00-10"].append((filename, score))
-        else:
-            for i in range(len(bins)-1):
-                if bins[i] <= score < bins[i+1] or (i == len(bins)-2 and score == bins[i+1]):  # 处理100分的情况
-                    range_key = f"{int(bins[i]):02d}-{int(bins[i+1]):02d}"
-                    score_ranges[range_key].append((filename, score))
-                    break
-    
-    # 计算每个区间的文件数量
-    hist, bin_edges = np.histogram(scores, bins=bins)
+    # 向量化计算每个score所属的区间，再按区间稳定排序，使同一区间的文件下标连续
+    buckets = _score_buckets(scores)
+    order = np.argsort(buckets, kind='stable')
+    
+    # 计算每个区间的文件数量（超出100的score排在最后，不计入任何区间）
+    counts = np.bincount(buckets, minlength=SCORE_BIN_COUNT + 1)[:SCORE_BIN_COUNT]
+    offsets = np.concatenate(([0], np.cumsum(counts)))
     
     # 保存每个区间的文件名到单独的文件中，文件名后跟得分
-    for i, (range_key, files_in_range) in enumerate(score_ranges.items()):
+    for i in range(SCORE_BIN_COUNT):
+        range_key = f"{i * 10:02d}-{(i + 1) * 10:02d}"
+        files_in_range = [(filenames[j], scores[j]) for j in order[offsets[i]:offsets[i + 1]]]
+        
         # 修改：按数字顺序排序文件名
-        files_in_range.sort(key=lambda x: re.findall(r'\d+', x[0]))
+        files_in_range.sort(key=lambda x: _natural_key(x[0]))
         
         # 修改：总是为所有区间创建文件，即使为空
-        output_filename = f"{base_name}_files_scores{range_key}_cnt-{hist[i]}.txt"
+        output_filename = f"{base_name}_files_scores{range_key}_cnt-{counts[i]}.txt"
         with open(output_filename, 'w', encoding='utf-8') as f:
             for filename, score in files_in_range:
                 f.write(f"{filename} score:{score}\n")
         print(f"得分区间 {range_key} 的文件名已保存到: {output_filename} (共{len(files_in_range)}个文件)")
     
     # 特别处理没有检测到目标的文件（Object count: 0 或 not detect）
-    zero_detection_files = []
-    # 修改这里，直接使用原始文件路径而不是构造新路径
-    log_file_path = base_name + '_result.txt'
-    if os.path.exists(log_file_path):
-        with open(log_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 查找所有没有检测到目标的文件块
-        file_blocks = content.split('File: ')[1:]
-        for block in file_blocks:
-            lines = block.strip().split('\n')
-            filename_line = lines[0]
-            filename = filename_line.strip()
-            
-            # 检查是否有"Object count: 0"或包含"not detect"的行
-            has_zero_objects = any('Object count: 0' in line for line in lines)
-            has_not_detect = any('not detect' in line.lower() for line in lines)
-            
-            if has_zero_objects or has_not_detect:
-                zero_detection_files.append(filename)
-        
-        # 修改：按数字顺序排序文件名
-        zero_detection_files.sort(key=lambda x: re.findall(r'\d+', x))
-        
-        # 保存没有检测到目标的文件列表
-        if zero_detection_files:
-            output_filename = f"{base_name}_files_no_detections_total-{len(zero_detection_files)}.txt"
-            with open(output_filename, 'w', encoding='utf-8') as f:
-                for filename in zero_detection_files:
-                    f.write(f"{filename}\n")
-            print(f"没有检测到目标的文件已保存到: {output_filename} (共{len(zero_detection_files)}个文件)")
-    else:
-        print(f"警告: 原始日志文件 {log_file_path} 不存在，无法处理无检测文件")
+    if no_detection_files is None:
+        # 未提供扫描结果时，直接读取原始日志文件
+        log_file_path = base_name + '_result.txt'
+        if not os.path.exists(log_file_path):
+            print(f"警告: 原始日志文件 {log_file_path} 不存在，无法处理无检测文件")
+            return
+        no_detection_files = scan_log(log_file_path).no_detection_files
+    
+    # 修改：按数字顺序排序文件名
+    zero_detection_files = sorted(no_detection_files, key=_natural_key)
+    
+    # 保存没有检测到目标的文件列表
+    if zero_detection_files:
+        output_filename = f"{base_name}_files_no_detections_total-{len(zero_detection_files)}.txt"
+        with open(output_filename, 'w', encoding='utf-8') as f:
+            for filename in zero_detection_files:
+                f.write(f"{filename}\n")
+        print(f"没有检测到目标的文件已保存到: {output_filename} (共{len(zero_detection_files)}个文件)")
 
 def count_files(file_path):
     """
@@ -132,13 +250,7 @@ def count_files(file_path):
     Returns:
         int: 文件数量
     """
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # 使用正则表达式匹配File行
-    file_pattern = r'File:.*'
-    file_matches = re.findall(file_pattern, content)
-    return len(file_matches)
+    return scan_log(file_path).file_count
 
 # 新增函数：统计包含"detected"字符串的文件数量
 def count_detected_files(file_path):
@@ -151,19 +263,7 @@ def count_detected_files(file_path):
     Returns:
         int: 包含检测结果的文件数量
     """
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # 使用File分割符来分割文件块，然后检查每个文件块是否包含检测结果
-    file_blocks = content.split('File: ')[1:]  # 分割成块，每块是一个文件的信息
-    detected_count = 0
-    
-    for block in file_blocks:
-        # 检查文件块中是否包含"detected"但不包含"not detect"
-        if 'detected' in block and 'not detect' not in block:
-            detected_count += 1
-    
-    return detected_count
+    return scan_log(file_path).detected_count
 
 def analyze_scores(scores, file_count, total_detections,label="Scores"):
     """
@@ -197,8 +297,9 @@ def analyze_scores(scores, file_count, total_detections,label="Scores"):
     print(f"检测目标总数: {total}")
     
     # 将分数分为10个等分区间 (0-100)
-    bins = np.linspace(0, 100, 11)  # 0, 10, 20, ..., 100
-    hist, bin_edges = np.histogram(scores, bins=bins)
+    # score为整数且区间等宽，直接按区间下标计数，无需np.histogram的边界查找
+    bin_edges = np.arange(0, 101, 10)  # 0, 10, 20, ..., 100
+    hist = np.bincount(_score_buckets(scores), minlength=SCORE_BIN_COUNT + 1)[:SCORE_BIN_COUNT]
     
     print(f"\n=== {label} 得分分布 ===")
     for i in range(len(hist)):
@@ -263,22 +364,21 @@ def analyze_scores(scores, file_count, total_detections,label="Scores"):
     print(f"\n图表已保存为: {output_file}")
     plt.close()
 
-def compare_logs(file_paths, total_detections):
+def compare_logs(summaries, total_detections):
     """
     比较多个日志文件的得分分布
     
     Args:
-        file_paths (list): 日志文件路径列表
+        summaries (list): (日志文件路径, LogSummary扫描结果) 列表
+        total_detections (int): 所有文件的总检测数量
     """
     all_scores = []
     all_file_counts = []
     labels = []
     
-    for file_path in file_paths:
-        scores, _ = parse_log_file(file_path)  # 只需要scores
-        file_count = count_files(file_path)
-        all_scores.append(scores)
-        all_file_counts.append(file_count)
+    for file_path, summary in summaries:
+        all_scores.append(summary.scores)
+        all_file_counts.append(summary.file_count)
         labels.append(os.path.basename(file_path).replace('_result.txt', '').capitalize())
     
     # 创建对比图表
@@ -321,29 +421,29 @@ def main():
     parser.add_argument("files", nargs='+', help="日志文件路径")
     parser.add_argument("--compare", action="store_true", help="比较多个日志文件")
     args = parser.parse_args()
-    total_detections = 0
-    # 计算所有文件的总检测数量
-
-    for file_path in args.files:
-        if os.path.exists(file_path):
-            # 修改为统计包含"detected"字符串的文件数量
-            total_detections += count_detected_files(file_path)
+    
+    # 每个日志文件只扫描一次，后续统计、绘图和分类都复用扫描结果；绘图仍在主进程中进行
+    summaries = scan_logs([file_path for file_path in args.files if os.path.exists(file_path)])
+    
+    # 计算所有文件的总检测数量（包含"detected"字符串的文件数量）
+    total_detections = sum(summary.detected_count for _, summary in summaries)
     
     print(f"所有文件总检测数量: {total_detections}")
 
     if args.compare and len(args.files) > 1:
-        compare_logs(args.files,total_detections)
+        compare_logs(summaries, total_detections)
     else:
+        summary_by_path = dict(summaries)
         for file_path in args.files:
-            if os.path.exists(file_path):
-                scores, filenames = parse_log_file(file_path)  # 获取scores和filenames
-                file_count = count_files(file_path)
+            if file_path in summary_by_path:
+                summary = summary_by_path[file_path]
                 label = os.path.basename(file_path).replace('_result.txt', '').capitalize()
-                analyze_scores(scores, file_count, total_detections,label)
+                analyze_scores(summary.scores, summary.file_count, total_detections,label)
                 
                 # 保存文件名按得分区间分类
                 base_name = os.path.basename(file_path).replace('_result.txt', '')
-                save_filenames_by_score_ranges(scores, filenames, base_name)
+                save_filenames_by_score_ranges(summary.scores, summary.filenames, base_name,
+                                               summary.no_detection_files)
             else:
                 print(f"文件不存在: {file_path}")
 
@@ -1,41 +1,288 @@
 import cv2
 import os
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 import numpy as np
 
-def bgr_to_nv12(image):
+# PyAV为可选依赖，仅在使用 --decoder pyav 时需要
+try:
+    import av
+except ImportError:
+    av = None
+
+# 硬件解码接口需要PyAV 14及以上版本，旧版本只使用软件解码
+try:
+    from av.codec.hwaccel import HWAccel, hwdevices_available
+except ImportError:
+    HWAccel = None
+
+# 各输出格式对应的文件扩展名
+OUTPUT_EXTENSIONS = {'jpeg': 'jpg', 'yuv': 'yuv', 'rgb': 'rgb'}
+
+# 各输出格式对应的PyAV像素格式，解码帧直接转换为目标格式
+_PYAV_PIXEL_FORMATS = {'jpeg': 'bgr24', 'yuv': 'nv12', 'rgb': 'rgb24'}
+
+# PyAV依次尝试的硬件解码设备类型
+_PYAV_HWACCEL_DEVICES = ('cuda', 'vaapi', 'qsv', 'videotoolbox', 'd3d11va')
+
+# 帧间隔达到该值时，改为按帧号定位读取，而不是逐帧grab()跳过
+SEEK_FRAME_INTERVAL = 30
+
+# 直接写文件描述符时使用的打开标志（Windows下需要O_BINARY）
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+
+def _write_file(output_filename, data):
+    """
+    将整块数据一次性写入文件，绕过Python的文件缓冲层
+    
+    Args:
+        output_filename (str): 输出文件路径
+        data: 支持缓冲区协议的连续数据（bytes、memoryview、numpy数组等）
+    """
+    view = memoryview(data).cast('B')
+    fd = os.open(output_filename, _WRITE_FLAGS, 0o644)
+    try:
+        # os.write可能只写入部分数据，循环直到全部写完
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+def bgr_to_nv12(image, out=None):
     """
     将BGR图像转换为NV12格式
     
     Args:
-        image: BGR格式的numpy数组 (height, width, 3)
+        image: BGR格式的numpy数组 (height, width, 3)，宽高需为偶数
+        out: 可选的预分配输出缓冲区（uint8，共 height*width*3/2 个元素），为None时新分配
         
     Returns:
-        NV12格式的字节数据
+        NV12格式数据的memoryview（一维、连续）
     """
     height, width = image.shape[:2]
     
-    # 先转换为YUV格式
-    yuv_image = cv2.cvtColor(image, cv2.COLOR_BGR2YUV)
+    if out is None:
+        out = np.empty(height * width * 3 // 2, dtype=np.uint8)
+    nv12_data = out.reshape(height * 3 // 2, width)
     
-    # 提取Y通道
-    y_channel = yuv_image[:, :, 0]
+    # 使用OpenCV原生的I420转换，直接写入输出缓冲区：I420与NV12大小相同且Y平面布局一致，
+    # 转换后Y平面已就位，只需把其后的平面U、V改为交错排列
+    cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420, dst=nv12_data)
     
-    # 提取U和V通道并下采样(隔行隔列采样)
-    u_channel = yuv_image[::2, ::2, 1]
-    v_channel = yuv_image[::2, ::2, 2]
+    # 复制出色度数据（仅占整帧的1/3），按字节偏移拆分U、V平面（高度的一半为奇数时U/V平面不按整行对齐）
+    chroma = nv12_data[height:].reshape(-1).copy()
+    chroma_size = chroma.size // 2
+    u_plane = chroma[:chroma_size].reshape(height // 2, width // 2)
+    v_plane = chroma[chroma_size:].reshape(height // 2, width // 2)
     
-    # U和V通道交错排列形成UV平面
-    uv_interleaved = np.zeros((u_channel.shape[0], u_channel.shape[1] * 2), dtype=np.uint8)
-    uv_interleaved[:, ::2] = u_channel
-    uv_interleaved[:, 1::2] = v_channel
+    # UV平面视为 (height/2, width/2, 2) 的双通道图像，cv2.merge一次完成交错写入
+    uv_plane = nv12_data[height:].reshape(height // 2, width // 2, 2)
+    cv2.merge([u_plane, v_plane], dst=uv_plane)
     
-    # 将Y和UV数据连接
-    nv12_data = np.concatenate([y_channel.flatten(), uv_interleaved.flatten()])
+    return nv12_data.reshape(-1).data
+
+def _alloc_output_buffer(output_format, width, height):
+    """
+    为指定输出格式分配格式转换用的缓冲区
     
-    return nv12_data.tobytes()
+    Args:
+        output_format (str): 输出图像格式，'jpeg', 'yuv' 或 'rgb'
+        width (int): 输出图像宽度
+        height (int): 输出图像高度
+        
+    Returns:
+        numpy数组，JPEG格式不需要转换缓冲区时返回None
+    """
+    if output_format == 'yuv':
+        return np.empty(height * width * 3 // 2, dtype=np.uint8)
+    if output_format == 'rgb':
+        return np.empty((height, width, 3), dtype=np.uint8)
+    return None
 
-def video_to_images(video_path, output_dir, frame_interval=1, width=640, height=360, output_format='jpeg'):
+def _write_frame(frame, output_filename, output_format, output_buffer=None, converted=False):
+    """
+    将一帧图像按指定格式编码并写入文件（在写盘线程池中执行）
+    
+    Args:
+        frame: BGR格式的numpy数组；converted为True时为已是目标格式的连续数据
+        output_filename (str): 输出文件路径
+        output_format (str): 输出图像格式，'jpeg', 'yuv' 或 'rgb'
+        output_buffer: 可选的格式转换缓冲区，见 _alloc_output_buffer
+        converted (bool): 帧数据是否已由解码器转换为目标像素格式（如PyAV输出的NV12/RGB），为True时直接写入
+    """
+    if converted:
+        data = frame
+    elif output_format == 'yuv':
+        # 转换BGR到NV12格式
+        data = bgr_to_nv12(frame, output_buffer)
+    elif output_format == 'rgb':
+        # 转换BGR到RGB
+        data = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=output_buffer)
+    else:
+        # 先在内存中编码，再与其它格式一样通过文件描述符一次性写入
+        ok, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        if not ok:
+            print(f"警告：JPEG编码失败 {output_filename}")
+            return
+    
+    _write_file(output_filename, data)
+    print(f"已保存: {output_filename}")
+
+class _FrameWriter:
+    """
+    有界的写盘线程池：排队中的任务数达到上限时阻塞提交方，退出时等待并检查所有任务
+    
+    OpenCV编码和文件写入会释放GIL，使下一帧的解码与当前帧的写盘重叠
+    """
+    
+    def __init__(self):
+        workers = os.cpu_count() or 1
+        self.max_pending = workers * 2
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._pending = deque()
+    
+    def wait_for_slot(self):
+        """
+        限制排队中的帧数，写盘跟不上时阻塞解码，避免内存无限增长；
+        返回后最早的 max_pending 帧之前提交的任务已完成，其占用的缓冲区可以复用
+        """
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft().result()
+    
+    def submit(self, fn, *args, **kwargs):
+        """提交一个写盘任务，必要时先等待空位"""
+        self.wait_for_slot()
+        self._pending.append(self._pool.submit(fn, *args, **kwargs))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 等待所有写盘任务完成
+        self._pool.shutdown(wait=True)
+        # 检查剩余写盘任务的结果，传播工作线程中的异常（解码出错时保留原异常）
+        if exc_type is None:
+            for future in self._pending:
+                future.result()
+        return False
+
+def _iter_sampled_frames(cap, frame_interval, total_frames):
+    """
+    按帧间隔依次读取需要保存的帧
+    
+    Args:
+        cap: 已打开的cv2.VideoCapture对象
+        frame_interval (int): 帧间隔
+        total_frames (int): 视频总帧数（未知时为0）
+        
+    Yields:
+        BGR格式的numpy数组
+    """
+    # 间隔很大且容器支持按帧号定位时（如带索引的mp4/mkv），直接定位到目标帧，中间帧完全不读取
+    if frame_interval >= SEEK_FRAME_INTERVAL and total_frames > 0 and cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+        for target in range(0, total_frames, frame_interval):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+        return
+    
+    frame_count = 0
+    while True:
+        # 不需要保存的帧只用grab()跳过，不做解码和颜色转换
+        if frame_count % frame_interval != 0:
+            # 如果没有更多帧，则退出循环
+            if not cap.grab():
+                return
+        else:
+            # 读取并解码需要保存的帧
+            ret, frame = cap.read()
+            
+            # 如果没有更多帧，则退出循环
+            if not ret:
+                return
+            yield frame
+        frame_count += 1
+
+def _open_pyav(video_path):
+    """
+    使用PyAV打开视频文件，依次尝试可用的硬件解码设备，均不可用（或PyAV版本不支持）时使用软件解码
+    
+    Args:
+        video_path (str): 视频文件路径
+        
+    Returns:
+        av.container.InputContainer: 已打开的视频容器
+    """
+    if HWAccel is None:
+        return av.open(video_path)
+    
+    available = hwdevices_available()
+    for device_type in _PYAV_HWACCEL_DEVICES:
+        if device_type not in available:
+            continue
+        try:
+            return av.open(video_path, hwaccel=HWAccel(device_type=device_type))
+        except av.FFmpegError:
+            # 设备无法初始化（无GPU、无权限等），尝试下一种
+            continue
+    return av.open(video_path)
+
+def _video_to_images_pyav(video_path, output_dir, frame_interval, width, height, output_format):
+    """
+    使用PyAV解码视频并保存为指定格式的图片，参数同 video_to_images
+    
+    解码后的帧由libswscale一次完成缩放和像素格式转换，YUV格式直接输出NV12，无需再经过BGR
+    """
+    try:
+        container = _open_pyav(video_path)
+    except av.FFmpegError:
+        print(f"错误：无法打开视频文件 {video_path}")
+        return
+    
+    stream = container.streams.video[0]
+    # 允许解码器使用帧级和片级多线程
+    stream.thread_type = 'AUTO'
+    
+    print(f"视频FPS: {float(stream.average_rate or 0)}")
+    print(f"总帧数: {stream.frames}")
+    print(f"输出分辨率: {width}x{height}")
+    print(f"输出格式: {output_format}")
+    
+    pixel_format = _PYAV_PIXEL_FORMATS[output_format]
+    extension = OUTPUT_EXTENSIONS[output_format]
+    saved_count = 0
+    
+    # 与OpenCV解码路径相同，编码和写盘交给有界的线程池
+    with _FrameWriter() as writer:
+        try:
+            for frame_index, frame in enumerate(container.decode(stream)):
+                # 不需要保存的帧不做缩放和格式转换
+                if frame_index % frame_interval != 0:
+                    continue
+                
+                image = frame.to_ndarray(width=width, height=height, format=pixel_format)
+                output_filename = os.path.join(output_dir, f"frame_{saved_count:06d}.{extension}")
+                
+                if output_format == 'jpeg':
+                    writer.submit(_write_frame, image, output_filename, output_format)
+                else:
+                    # swscale输出有行填充时，to_ndarray返回的是非连续视图，写盘前需转为连续数组
+                    writer.submit(_write_frame, np.ascontiguousarray(image), output_filename, output_format,
+                                  converted=True)
+                saved_count += 1
+        finally:
+            # 关闭视频容器
+            container.close()
+    
+    print(f"完成！共保存 {saved_count} 张图片到 {output_dir}")
+
+def video_to_images(video_path, output_dir, frame_interval=1, width=640, height=360, output_format='jpeg',
+                    decoder='opencv'):
     """
     将视频解码为指定格式的图片
     
@@ -46,14 +293,37 @@ def video_to_images(video_path, output_dir, frame_interval=1, width=640, height=
         width (int): 输出图像宽度，默认为640
         height (int): 输出图像高度，默认为360
         output_format (str): 输出图像格式，支持 'jpeg', 'yuv', 'rgb'，默认为 'jpeg'
+        decoder (str): 视频解码器，'opencv' 或 'pyav'（需安装PyAV），默认为 'opencv'
     """
     
     # 创建输出目录
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    # 打开视频文件
-    cap = cv2.VideoCapture(video_path)
+    output_format = output_format.lower()
+    if output_format not in OUTPUT_EXTENSIONS:
+        print(f"不支持的格式: {output_format}，使用默认JPEG格式")
+        output_format = 'jpeg'
+    extension = OUTPUT_EXTENSIONS[output_format]
+    
+    # NV12的色度平面为2x2下采样，要求宽高均为偶数
+    if output_format == 'yuv' and (width % 2 or height % 2):
+        print(f"错误：YUV(NV12)格式要求输出宽高为偶数，当前为 {width}x{height}")
+        return
+    
+    if decoder == 'pyav':
+        if av is None:
+            print("错误：未安装PyAV（pip install av），无法使用pyav解码器")
+            return
+        _video_to_images_pyav(video_path, output_dir, frame_interval, width, height, output_format)
+        return
+    
+    # 打开视频文件：优先使用FFmpeg后端并请求硬件解码（VAAPI/NVDEC等，不可用时自动使用软件解码）
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG,
+                           [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+    if not cap.isOpened():
+        # FFmpeg后端不可用时回退到默认后端
+        cap = cv2.VideoCapture(video_path)
     
     # 检查视频是否成功打开
     if not cap.isOpened():
@@ -63,58 +333,74 @@ def video_to_images(video_path, output_dir, frame_interval=1, width=640, height=
     # 获取视频的基本信息
     fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    # 容器记录的分辨率已是输出分辨率时通常无需缩放，此时不预分配缩放缓冲区
+    expect_resize = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                     int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))) != (width, height)
     
     print(f"视频FPS: {fps}")
     print(f"总帧数: {total_frames}")
     print(f"输出分辨率: {width}x{height}")
     print(f"输出格式: {output_format}")
     
-    frame_count = 0
     saved_count = 0
     
-    while True:
-        # 读取一帧
-        ret, frame = cap.read()
+    # 编码和写盘交给有界的线程池
+    with _FrameWriter() as writer:
+        max_pending = writer.max_pending
         
-        # 如果没有更多帧，则退出循环
-        if not ret:
-            break
+        # 预分配循环复用的缩放和格式转换缓冲区，每个排队中的写盘任务占用一组
+        resize_buffers = [np.empty((height, width, 3), dtype=np.uint8) if expect_resize else None
+                          for _ in range(max_pending)]
+        output_buffers = [_alloc_output_buffer(output_format, width, height) for _ in range(max_pending)]
         
-        # 根据帧间隔保存图片
-        if frame_count % frame_interval == 0:
-            # 调整帧大小为指定分辨率
-            resized_frame = cv2.resize(frame, (width, height))
-            
-            # 根据指定格式保存图像
-            if output_format.lower() == 'jpeg':
-                output_filename = os.path.join(output_dir, f"frame_{saved_count:06d}.jpg")
-                cv2.imwrite(output_filename, resized_frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-            elif output_format.lower() == 'yuv':
-                output_filename = os.path.join(output_dir, f"frame_{saved_count:06d}.yuv")
-                # 转换BGR到NV12格式
-                nv12_frame = bgr_to_nv12(resized_frame)
-                with open(output_filename, 'wb') as f:
-                    f.write(nv12_frame)
-            elif output_format.lower() == 'rgb':
-                output_filename = os.path.join(output_dir, f"frame_{saved_count:06d}.rgb")
-                # 转换BGR到RGB
-                rgb_frame = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2RGB)
-                with open(output_filename, 'wb') as f:
-                    f.write(rgb_frame.tobytes())
-            else:
-                print(f"不支持的格式: {output_format}，使用默认JPEG格式")
-                output_filename = os.path.join(output_dir, f"frame_{saved_count:06d}.jpg")
-                cv2.imwrite(output_filename, resized_frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-            
-            print(f"已保存: {output_filename}")
-            saved_count += 1
+        try:
+            # 根据帧间隔读取需要保存的帧
+            for frame in _iter_sampled_frames(cap, frame_interval, total_frames):
+                # 保证即将复用的缓冲区所属的写盘任务（max_pending帧之前）已经完成
+                writer.wait_for_slot()
+                slot = saved_count % max_pending
+                
+                # 调整帧大小为指定分辨率：按每帧的实际尺寸判断（流中途可能改变分辨率），已是输出尺寸时跳过缩放
+                if frame.shape[:2] == (height, width):
+                    resized_frame = frame
+                else:
+                    # 缓冲区尚未分配时由cv2.resize新建，之后在该槽位复用
+                    resized_frame = cv2.resize(frame, (width, height), dst=resize_buffers[slot])
+                    resize_buffers[slot] = resized_frame
+                output_filename = os.path.join(output_dir, f"frame_{saved_count:06d}.{extension}")
+                writer.submit(_write_frame, resized_frame, output_filename, output_format, output_buffers[slot])
+                saved_count += 1
+        finally:
+            # 释放视频捕获对象
+            cap.release()
+    
+    print(f"完成！共保存 {saved_count} 张图片到 {output_dir}")
+
+def _convert_image_to_yuv(input_path, output_filename, width, height):
+    """
+    将单个图片文件转换为YUV(NV12)格式并保存（在进程池中执行）
+    
+    Args:
+        input_path (str): 输入图片路径
+        output_filename (str): 输出YUV文件路径
+        width (int): 输出图像宽度
+        height (int): 输出图像高度
         
-        frame_count += 1
+    Returns:
+        bool: 是否转换成功
+    """
+    # 读取图片
+    image = cv2.imread(input_path)
     
-    # 释放视频捕获对象
-    cap.release()
+    if image is None:
+        return False
     
-    print(f"完成！共保存 {saved_count} 张图片到 {output_dir}")
+    # 调整图片大小
+    resized_image = cv2.resize(image, (width, height))
+    
+    # 转换为NV12格式并保存YUV数据
+    _write_file(output_filename, bgr_to_nv12(resized_image))
+    return True
 
 # 新增功能：将目录下的所有图片文件转换为YUV格式
 def images_to_yuv(input_dir, output_dir, width=640, height=360):
@@ -128,6 +414,11 @@ def images_to_yuv(input_dir, output_dir, width=640, height=360):
         height (int): 输出图像高度，默认为360
     """
     
+    # NV12的色度平面为2x2下采样，要求宽高均为偶数
+    if width % 2 or height % 2:
+        print(f"错误：YUV(NV12)格式要求输出宽高为偶数，当前为 {width}x{height}")
+        return
+    
     # 支持的图片格式
     supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
     
@@ -145,35 +436,24 @@ def images_to_yuv(input_dir, output_dir, width=640, height=360):
     print(f"找到 {len(image_files)} 个图片文件")
     print(f"输出分辨率: {width}x{height}")
     
+    # 构建完整的输入路径和输出文件名
+    input_paths = [os.path.join(input_dir, image_file) for image_file in image_files]
+    output_filenames = [os.path.join(output_dir, f"{os.path.splitext(image_file)[0]}.yuv")
+                        for image_file in image_files]
+    
     converted_count = 0
     
-    for image_file in image_files:
-        # 构建完整的文件路径
-        input_path = os.path.join(input_dir, image_file)
-        
-        # 读取图片
-        image = cv2.imread(input_path)
-        
-        if image is None:
-            print(f"警告：无法读取图片 {input_path}")
-            continue
-        
-        # 调整图片大小
-        resized_image = cv2.resize(image, (width, height))
-        
-        # 转换为NV12格式
-        nv12_data = bgr_to_nv12(resized_image)
-        
-        # 生成输出文件名
-        filename_without_ext = os.path.splitext(image_file)[0]
-        output_filename = os.path.join(output_dir, f"{filename_without_ext}.yuv")
-        
-        # 保存YUV数据
-        with open(output_filename, 'wb') as f:
-            f.write(nv12_data)
-        
-        print(f"已转换: {input_path} -> {output_filename}")
-        converted_count += 1
+    # 每张图片的转换相互独立，使用进程池并行处理；每个进程内OpenCV只用单线程，避免线程过度订阅
+    with ProcessPoolExecutor(initializer=cv2.setNumThreads, initargs=(1,)) as executor:
+        results = executor.map(_convert_image_to_yuv, input_paths, output_filenames,
+                               repeat(width), repeat(height), chunksize=16)
+        for input_path, output_filename, converted in zip(input_paths, output_filenames, results):
+            if not converted:
+                print(f"警告：无法读取图片 {input_path}")
+                continue
+            
+            print(f"已转换: {input_path} -> {output_filename}")
+            converted_count += 1
     
     print(f"完成！共转换 {converted_count} 个图片文件到 {output_dir}")
 
@@ -197,6 +477,8 @@ def main():
                         help="输出图像格式: jpeg, yuv, rgb (默认: jpeg)")
     parser.add_argument("--images-to-yuv", action="store_true", 
                         help="将输入目录中的所有图片转换为YUV格式")
+    parser.add_argument("--decoder", choices=['opencv', 'pyav'], default='opencv',
+                        help="视频解码器: opencv, pyav (需安装PyAV，支持硬件解码) (默认: opencv)")
     
     args = parser.parse_args()
     
@@ -210,7 +492,8 @@ def main():
         # 输入是文件，当作视频处理
         if args.images_to_yuv:
             print("警告：输入路径是文件，忽略 --images-to-yuv 参数，直接处理为视频")
-        video_to_images(args.input_path, args.output, args.interval, args.width, args.height, args.format)
+        video_to_images(args.input_path, args.output, args.interval, args.width, args.height, args.format,
+                        args.decoder)
     elif os.path.isdir(args.input_path):
         # 输入是目录，当作图片目录处理
         images_to_yuv(args.input_path, args.output, args.width, args.height)